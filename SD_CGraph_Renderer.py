@@ -8,26 +8,70 @@ bl_info = {
     "category" : "3D View"
 }
 
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import bpy
 import gpu
-from gpu_extras.batch import batch_for_shader
-from mathutils import Vector, Color
+import numpy as np
+from bpy.app.handlers import persistent
 
 # State Variables
 draw_handler = None
 is_drawing_active = False
 AUTO_NODE_NAME = "SNA_Auto_CurveToMesh"
 
+# Heatmap intensity -> RGBA lookup table, built in register()
+HEAT_LUT_SIZE = 1024
+_heat_lut = None
+
+# CGraph objects to draw: object name -> name of its CGraph modifier
+_candidates = {}
+
+# Scene name -> object names seen by its last candidate scan, for add/remove diffs
+_known_objects = {}
+
+# Candidate names still waiting for their Curve to Mesh node (see add_candidate)
+_pending_inject = set()
+
+# Node group name -> whether it is a CGraph group
+_ng_is_cgraph = {}
+
+# Active Group Output per node tree: tree name -> node name
+_output_cache = {}
+
+# Evaluated geometry per object: name -> (data name, local coords, edges)
+_geo_cache = {}
+
+# Edge classification per object: name -> (edges, hair edges, connector edges).
+# Survives geometry invalidation, GN re-evaluations often only move vertices.
+_topology_cache = {}
+
+# GPU batches per object: name -> (fingerprint, (gradient, solid, connector))
+_batch_cache = {}
+
+# Worker threads for per-object NumPy work, created in register() on multi-core machines
+_executor = None
+
+# Draw lists of the last collected frame per scene name, reused until
+# something changes (any change empties the whole dict)
+_frame_batches = {}
+
 # ------------------------------------------------------------------------
 #   HELPER FUNCTIONS
 # ------------------------------------------------------------------------
 
-def get_heatmap_color(value, alpha=1.0):
-    """0.0=Blue, 0.5=Green, 1.0=Red"""
-    c = Color()
-    hue = (1.0 - value) * 0.66
-    c.hsv = (hue, 1.0, 1.0)
-    return (c.r, c.g, c.b, alpha)
+def get_heatmap_colors(values, alpha=1.0):
+    """0.0=Blue, 0.5=Green, 1.0=Red. Takes an array, returns (N, 4) RGBA."""
+    # HSV -> RGB with S=V=1 reduces to a piecewise linear ramp per channel
+    h6 = (1.0 - np.asarray(values, dtype=np.float32)) * (0.66 * 6.0)
+    rgba = np.empty((h6.shape[0], 4), dtype=np.float32)
+    rgba[:, 0] = np.abs(h6 - 3.0) - 1.0
+    rgba[:, 1] = 2.0 - np.abs(h6 - 2.0)
+    rgba[:, 2] = 2.0 - np.abs(h6 - 4.0)
+    np.clip(rgba[:, :3], 0.0, 1.0, out=rgba[:, :3])
+    rgba[:, 3] = alpha
+    return rgba
 
 def get_modifier_scale_value(mod):
     """Retrieves graph scale for normalization."""
@@ -42,26 +86,85 @@ def get_modifier_scale_value(mod):
 #   AUTO NODE MANAGEMENT
 # ------------------------------------------------------------------------
 
+def is_cgraph_group(node_group):
+    # Keyed by name, so a renamed group simply gets a new entry
+    name = node_group.name
+    result = _ng_is_cgraph.get(name)
+    if result is None:
+        result = _ng_is_cgraph[name] = "cgraph" in name.lower()
+    return result
+
+def scan_cgraph_modifier(obj):
+    """First CGraph geometry nodes modifier on obj, or None."""
+    return next((mod for mod in obj.modifiers
+                 if mod.type == 'NODES' and mod.node_group and is_cgraph_group(mod.node_group)), None)
+
+def update_candidate(obj):
+    mod = scan_cgraph_modifier(obj) if obj.type in {'MESH', 'CURVE'} else None
+    if mod: _candidates[obj.name] = mod.name
+    else: _candidates.pop(obj.name, None)
+
+def refresh_candidates(scene):
+    _frame_batches.clear()
+    _candidates.clear()
+    _known_objects.clear()
+    _known_objects[scene.name] = set(scene.objects.keys())
+    for obj in scene.objects:
+        update_candidate(obj)
+
+def add_candidate(obj):
+    """Picks up an object that appeared or changed after enabling."""
+    update_candidate(obj)
+    if obj.name in _candidates:
+        # Editing the node tree from inside a depsgraph handler re-triggers
+        # it, so the injection runs from a timer once the update is over
+        if not _pending_inject: bpy.app.timers.register(inject_pending)
+        _pending_inject.add(obj.name)
+
+def inject_pending():
+    while _pending_inject:
+        name = _pending_inject.pop()
+        obj = bpy.data.objects.get(name)
+        if is_drawing_active and obj and name in _candidates: inject_curve_to_mesh(obj)
+    return None
+
+def sync_scene_objects(scene):
+    """Scans only the object names added/removed since the last scan."""
+    current = set(scene.objects.keys())
+    known = _known_objects.get(scene.name, set())
+    for name in known - current:
+        # Unlinked objects may still live in another scene
+        if name not in bpy.data.objects: forget_object(name)
+    for name in current - known:
+        add_candidate(scene.objects[name])
+    _known_objects[scene.name] = current
+
 def find_modifier_and_tree(obj):
-    for mod in obj.modifiers:
-        if mod.type == 'NODES' and mod.node_group:
-            if "cgraph" in mod.node_group.name.lower():
-                return mod, mod.node_group
-    return None, None
+    # Direct lookup by the cached modifier name, full scan only on a miss
+    mod_name = _candidates.get(obj.name)
+    mod = obj.modifiers.get(mod_name) if mod_name else None
+    if not mod or not mod.node_group:
+        mod = scan_cgraph_modifier(obj)
+    if not mod: return None, None
+    return mod, mod.node_group
+
+def find_output_node(tree):
+    """Active Group Output (or the first one), single pass over tree.nodes."""
+    node = _output_cache.get(tree.name)
+    node = tree.nodes.get(node) if node else None
+    if node and node.type == 'GROUP_OUTPUT' and node.is_active_output:
+        return node
+
+    outputs = [n for n in tree.nodes if n.type == 'GROUP_OUTPUT']
+    node = next((n for n in outputs if n.is_active_output), outputs[0] if outputs else None)
+    if node: _output_cache[tree.name] = node.name
+    return node
 
 def inject_curve_to_mesh(obj):
     mod, tree = find_modifier_and_tree(obj)
     if not tree or AUTO_NODE_NAME in tree.nodes: return
 
-    output_node = None
-    for node in tree.nodes:
-        if node.type == 'GROUP_OUTPUT' and node.is_active_output:
-            output_node = node
-            break
-    if not output_node:
-        for node in tree.nodes:
-            if node.type == 'GROUP_OUTPUT': output_node = node; break
-            
+    output_node = find_output_node(tree)
     if not output_node: return
 
     socket_in = output_node.inputs[0]
@@ -98,19 +201,306 @@ def remove_curve_to_mesh(obj):
     tree.nodes.remove(node_to_del)
 
 
+# ------------------------------------------------------------------------
+#   GEOMETRY CACHE
+# ------------------------------------------------------------------------
+
+def extract_evaluated_geometry(obj, depsgraph):
+    """Evaluates obj once and keeps only NumPy copies of its coords/edges."""
+    eval_obj = obj.evaluated_get(depsgraph)
+    try: mesh = eval_obj.to_mesh()
+    except RuntimeError: return None
+
+    co = np.empty(0, dtype=np.float32).reshape(0, 3)
+    ei = np.empty(0, dtype=np.int32).reshape(0, 2)
+    if mesh and len(mesh.edges) > 0:
+        # Local coords straight into a flat buffer (no per-vertex Vector math)
+        co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+        mesh.vertices.foreach_get("co", co)
+        co = co.reshape(-1, 3)
+
+        # Edge vertex pairs as an (E, 2) index array
+        ei = np.empty(len(mesh.edges) * 2, dtype=np.int32)
+        mesh.edges.foreach_get("vertices", ei)
+        ei = ei.reshape(-1, 2)
+    eval_obj.to_mesh_clear()
+
+    data_name = obj.data.name if obj.data else None
+    return data_name, co, ei
+
+def invalidate_geometry(name=None):
+    """Drops cached geometry and batches for one object, or all if name is None."""
+    _frame_batches.clear()
+    if name is None:
+        _geo_cache.clear()
+        _batch_cache.clear()
+    else:
+        _geo_cache.pop(name, None)
+        _batch_cache.pop(name, None)
+
+def forget_object(name):
+    """Drops every per-object entry of an object that is no longer drawn."""
+    _candidates.pop(name, None)
+    _topology_cache.pop(name, None)
+    invalidate_geometry(name)
+
+def get_cached_geometry(obj, depsgraph):
+    entry = _geo_cache.get(obj.name)
+    data_name = obj.data.name if obj.data else None
+    if entry is None or entry[0] != data_name:
+        entry = extract_evaluated_geometry(obj, depsgraph)
+        if entry is None: return None
+        _geo_cache[obj.name] = entry
+    return entry
+
+@persistent
+def on_depsgraph_update(scene, depsgraph):
+    # Transforms, visibility and settings all come through here
+    _frame_batches.clear()
+    shared_data_changed = False
+    known = _known_objects.get(scene.name, ())
+    objects_changed = is_drawing_active and len(scene.objects) != len(known)
+    for update in depsgraph.updates:
+        id_data = update.id
+        if isinstance(id_data, bpy.types.Object):
+            if is_drawing_active:
+                if id_data.name not in known:
+                    # Added, duplicated, linked or renamed. Instanced and
+                    # dependency objects outside this scene don't count.
+                    if id_data.name in scene.objects: objects_changed = True
+                elif update.is_updated_geometry:
+                    # Modifier stack edits / node group swaps
+                    add_candidate(id_data.original)
+            if update.is_updated_geometry:
+                invalidate_geometry(id_data.name)
+        elif isinstance(id_data, (bpy.types.NodeTree, bpy.types.Mesh, bpy.types.Curve)):
+            shared_data_changed = True
+
+    # Shared data changed, we can't tell which objects use it. Cleared once
+    # after the loop so the object updates above are all still handled.
+    if shared_data_changed: invalidate_geometry()
+    if objects_changed: sync_scene_objects(scene)
+
+@persistent
+def on_frame_change(scene, depsgraph):
+    # Animated transforms only need the frame lists rebuilt, keep the cached
+    # geometry of everything the new frame didn't re-evaluate
+    _frame_batches.clear()
+    for update in depsgraph.updates:
+        if isinstance(update.id, bpy.types.Object) and update.is_updated_geometry:
+            # Animated node inputs / modifier settings
+            invalidate_geometry(update.id.name)
+
+@persistent
+def on_load_post(*args):
+    _frame_batches.clear()
+    invalidate_geometry()
+    _topology_cache.clear()
+    _output_cache.clear()
+    _ng_is_cgraph.clear()
+    _candidates.clear()
+    # Timers don't survive a file load
+    _pending_inject.clear()
+    if is_drawing_active: refresh_candidates(bpy.context.scene)
+
+
 # ------------------------------------------------------------------------
 #   SMART DRAWING LOGIC (Topology Filter)
 # ------------------------------------------------------------------------
 
+def make_vertbuf(attr_id, data):
+    """Uploads an (N, K) float32 array as a single-attribute vertex buffer."""
+    fmt = gpu.types.GPUVertFormat()
+    fmt.attr_add(id=attr_id, comp_type='F32', len=data.shape[1], fetch_mode='FLOAT')
+    vbo = gpu.types.GPUVertBuf(format=fmt, len=len(data))
+    vbo.attr_fill(id=attr_id, data=data)
+    return vbo
+
+def make_lines_batch(vbo, edges):
+    """Indexed LINES batch, edges is an (E, 2) int32 array into vbo."""
+    ibo = gpu.types.GPUIndexBuf(type='LINES', seq=edges)
+    return gpu.types.GPUBatch(type='LINES', buf=vbo, elem=ibo)
+
+def classify_edges(ei, vertex_count):
+    """Splits (E, 2) edges into (hair edges, connector edges)."""
+    # --- TOPOLOGY ANALYSIS (The Smart Part) ---
+    # 1. Count connections per vertex
+    # If a vertex has 1 edge, it's an end-point. If 2, it's inside a line.
+    # Comb "Hairs" are typically isolated segments (Count=1 and Count=1).
+    # Connection lines are chains.
+    vert_edge_counts = np.bincount(ei.ravel(), minlength=vertex_count)
+
+    # HEURISTIC:
+    # If both vertices of an edge have only 1 connection,
+    # it's a disjoint "Comb Hair".
+    hair_mask = (vert_edge_counts[ei[:, 0]] == 1) & (vert_edge_counts[ei[:, 1]] == 1)
+    # ---> RENDER AS CONNECTOR (Crest / Base)
+    # We draw these separately with a clean contrast color
+    # to visualize flow/acceleration.
+    return ei[hair_mask], ei[~hair_mask]
+
+def prepare_object_arrays(geometry, topology, world_rot, modifier_graph_scale, use_gradient, limit_setting):
+    """NumPy-only part of a batch rebuild, safe to run off the main thread.
+    topology is the cached classification, or None if it has to be redone.
+    Returns (coords, hair edges, connector edges, heatmap colors or None, topology)."""
+    _, co, ei = geometry
+
+    if topology is None:
+        topology = (ei,) + classify_edges(ei, len(co))
+    _, hair_edges, conn_edges = topology
+
+    heatmap_col = None
+    if len(hair_edges) and use_gradient:
+        # ---> RENDER AS HEATMAP (Vertical Bar)
+        # Lengths are measured in world space (object scale counts)
+        d = (co[hair_edges[:, 0]] - co[hair_edges[:, 1]]) @ world_rot.T
+        visual_length = np.sqrt((d * d).sum(axis=1))
+        real_curvature_val = visual_length / modifier_graph_scale
+
+        intensity = real_curvature_val / limit_setting
+        # One LUT gather per hair. Hair vertices belong to exactly one edge,
+        # so per-vertex color is just the hair color on both endpoints.
+        # The index is clipped after nan_to_num: a NaN coord from the node
+        # tree must not turn into an out-of-range index.
+        lut_idx = np.clip(np.rint(np.nan_to_num(intensity * (HEAT_LUT_SIZE - 1))),
+                          0, HEAT_LUT_SIZE - 1).astype(np.int32)
+        heatmap_col = np.zeros((len(co), 4), dtype=np.float32)
+        heatmap_col[hair_edges[:, 0]] = _heat_lut[lut_idx]
+        heatmap_col[hair_edges[:, 1]] = _heat_lut[lut_idx]
+
+    return co, hair_edges, conn_edges, heatmap_col, topology
+
+def build_object_batches(co, hair_edges, conn_edges, heatmap_col):
+    """Returns (gradient, solid, connector) batches in local space, None where empty.
+    Uploads to the GPU, so main thread only."""
+    if not len(hair_edges) and not len(conn_edges): return None, None, None
+
+    # 2. Unique vertices uploaded once (object space, matrix_world is applied
+    # on the GPU at draw time), each category is just an index buffer into it.
+    pos_vbo = make_vertbuf("pos", co)
+
+    grad_batch = solid_batch = conn_batch = None
+    if len(hair_edges) and heatmap_col is not None:
+        grad_batch = make_lines_batch(pos_vbo, hair_edges)
+        grad_batch.vertbuf_add(make_vertbuf("color", heatmap_col))
+    elif len(hair_edges):
+        # ---> RENDER AS SOLID USER COLOR (Vertical Bar)
+        # Color comes from a uniform at draw time, no per-vertex color buffer
+        solid_batch = make_lines_batch(pos_vbo, hair_edges)
+
+    if len(conn_edges):
+        conn_batch = make_lines_batch(pos_vbo, conn_edges)
+
+    return grad_batch, solid_batch, conn_batch
+
+def draw_in_object_space(batches, shader):
+    """Draws (matrix_world, batch) pairs with the model matrix on the GPU stack."""
+    for matrix_world, batch in batches:
+        with gpu.matrix.push_pop():
+            gpu.matrix.multiply_matrix(matrix_world)
+            batch.draw(shader)
+
+def collect_frame_batches(scene, depsgraph, use_gradient, limit_setting):
+    """Returns (gradient, solid by color, connector) draw lists for this frame."""
+    visible = []
+    rebuild_jobs = []
+
+    # --- MAIN LOOP ---
+    for name, mod_name in list(_candidates.items()):
+        obj = scene.objects.get(name)
+        if not obj:
+            # Candidates span all scenes, only forget objects deleted for good
+            if name not in bpy.data.objects: forget_object(name)
+            continue
+        target_mod = obj.modifiers.get(mod_name)
+        if not target_mod:
+            # Modifier renamed (no geometry update for that), rescan this object
+            update_candidate(obj)
+            mod_name = _candidates.get(name)
+            target_mod = obj.modifiers.get(mod_name) if mod_name else None
+        if not target_mod:
+            # No CGraph modifier left
+            forget_object(name)
+            continue
+        if not obj.visible_get(): continue
+
+        modifier_graph_scale = get_modifier_scale_value(target_mod)
+        if modifier_graph_scale == 0: modifier_graph_scale = 0.001 
+
+        # Everything the batches depend on besides the evaluated geometry,
+        # which invalidates its own entry through the depsgraph handler.
+        # Location/rotation/scale only matter for the heatmap lengths.
+        matrix_world = obj.matrix_world.copy()
+        fingerprint = (matrix_world.to_3x3() if use_gradient else None, use_gradient, limit_setting, modifier_graph_scale)
+        cached = _batch_cache.get(name)
+        if cached is None or cached[0] != fingerprint:
+            # to_mesh() must run here, on the main thread
+            geometry = get_cached_geometry(obj, depsgraph)
+            if geometry is None: continue
+            # Same edges as last time: keep the classification. An exact
+            # compare is cheaper than hashing the buffer and can't collide.
+            topology = _topology_cache.get(name)
+            if topology:
+                edges = geometry[2]
+                topology = (edges,) + topology[1:] if np.array_equal(topology[0], edges) else None
+            world_rot = np.array(matrix_world, dtype=np.float32)[:3, :3]
+            rebuild_jobs.append((name, fingerprint, (
+                geometry, topology, world_rot, modifier_graph_scale, use_gradient, limit_setting)))
+        visible.append((name, obj, matrix_world))
+
+    # NumPy work of all rebuilt objects overlaps in the pool (the bincount,
+    # bool reductions, ufuncs and take/put gathers release the GIL on large
+    # arrays), GPU uploads stay on the main thread
+    if _executor and len(rebuild_jobs) > 1:
+        futures = [_executor.submit(prepare_object_arrays, *args) for _, _, args in rebuild_jobs]
+        results = [f.result() for f in futures]
+    else:
+        results = [prepare_object_arrays(*args) for _, _, args in rebuild_jobs]
+    for (name, fingerprint, _), arrays in zip(rebuild_jobs, results):
+        _topology_cache[name] = arrays[4]
+        _batch_cache[name] = (fingerprint, build_object_batches(*arrays[:4]))
+
+    # Cached batches to draw, grouped by shader
+    grad_batches = []
+    solid_batches_by_color = {}
+    conn_batches = []
+    for name, obj, matrix_world in visible:
+        grad_batch, solid_batch, conn_batch = _batch_cache[name][1]
+        if grad_batch: grad_batches.append((matrix_world, grad_batch))
+        if solid_batch:
+            obj_base_color = tuple(getattr(obj, "sd_cgraph_color", (0, 1, 1, 1)))
+            solid_batches_by_color.setdefault(obj_base_color, []).append((matrix_world, solid_batch))
+        if conn_batch: conn_batches.append((matrix_world, conn_batch))
+
+    return grad_batches, solid_batches_by_color, conn_batches
+
 def draw_lines_callback():
-    try:
-        scene = bpy.context.scene
-        depsgraph = bpy.context.evaluated_depsgraph_get()
+    try: scene = bpy.context.scene
     except: return
 
+    # Configs, each RNA property is read once per redraw
+    thickness = getattr(scene, "sd_cgraph_thickness", 2.0)
+    always_on_top = getattr(scene, "sd_cgraph_always_on_top", True)
+    # New Config: Color for the crest/connections (Solid white/custom)
+    conn_color = getattr(scene, "sd_cgraph_connector_color", (1.0, 1.0, 1.0, 1.0))
+
+    # Idle redraws (orbit, overlays...) reuse the last draw lists as-is,
+    # per scene so windows showing different scenes don't evict each other
+    frame = _frame_batches.get(scene.name)
+    if frame is None:
+        try: depsgraph = bpy.context.evaluated_depsgraph_get()
+        except: return
+        # First draw of a scene since enabling, pick up its candidates
+        if scene.name not in _known_objects: sync_scene_objects(scene)
+        use_gradient = getattr(scene, "sd_cgraph_use_gradient", False)
+        limit_setting = getattr(scene, "sd_cgraph_gradient_max", 1.0)
+        frame = collect_frame_batches(scene, depsgraph, use_gradient, limit_setting)
+        _frame_batches[scene.name] = frame
+    grad_batches, solid_batches_by_color, conn_batches = frame
+
     # --- GPU SETTINGS ---
-    gpu.state.line_width_set(getattr(scene, "sd_cgraph_thickness", 2.0))
-    if getattr(scene, "sd_cgraph_always_on_top", True):
+    gpu.state.line_width_set(thickness)
+    if always_on_top:
         gpu.state.depth_test_set('NONE')
     else:
         gpu.state.depth_test_set('LESS_EQUAL')
@@ -123,115 +513,35 @@ def draw_lines_callback():
 
     shader_flat = gpu.shader.from_builtin('UNIFORM_COLOR')
 
-    # Configs
-    use_gradient = getattr(scene, "sd_cgraph_use_gradient", False)
-    limit_setting = getattr(scene, "sd_cgraph_gradient_max", 1.0) 
-    
-    # New Config: Color for the crest/connections (Solid white/custom)
-    conn_color = getattr(scene, "sd_cgraph_connector_color", (1.0, 1.0, 1.0, 1.0))
+    # --- BATCH DRAWING ---
+    # Each shader is bound once per frame, not per object
 
-    # --- MAIN LOOP ---
-    for obj in scene.objects:
-        if not obj.visible_get() or obj.type not in {'MESH', 'CURVE'}:
-            continue
-            
-        target_mod = None
-        for mod in obj.modifiers:
-            if mod.type == 'NODES' and mod.node_group and "cgraph" in mod.node_group.name.lower():
-                target_mod = mod
-                break
-        if not target_mod: continue
+    # 1. Draw Heatmap/Combs
+    if grad_batches:
+        shader_grad.bind()
+        draw_in_object_space(grad_batches, shader_grad)
 
-        modifier_graph_scale = get_modifier_scale_value(target_mod)
-        if modifier_graph_scale == 0: modifier_graph_scale = 0.001 
+    # 2. Draw Solid Combs, one color uniform per distinct user color
+    if solid_batches_by_color:
+        shader_flat.bind()
+        for color, batches in solid_batches_by_color.items():
+            shader_flat.uniform_float("color", color)
+            draw_in_object_space(batches, shader_flat)
 
-        eval_obj = obj.evaluated_get(depsgraph)
-        try: mesh = eval_obj.to_mesh()
-        except RuntimeError: continue
+    # 3. Draw Connectors (Crests)
+    if conn_batches:
+        shader_flat.bind()
+        # We draw connectors slightly thicker or different color to analyze flow
+        shader_flat.uniform_float("color", conn_color)
 
-        if mesh and len(mesh.edges) > 0:
-            world_mat = obj.matrix_world
-            verts_co_world = [world_mat @ v.co for v in mesh.vertices]
-            
-            # --- TOPOLOGY ANALYSIS (The Smart Part) ---
-            # 1. Count connections per vertex
-            # If a vertex has 1 edge, it's an end-point. If 2, it's inside a line.
-            # Comb "Hairs" are typically isolated segments (Count=1 and Count=1).
-            # Connection lines are chains.
-            
-            vert_edge_counts = [0] * len(mesh.vertices)
-            for edge in mesh.edges:
-                vert_edge_counts[edge.vertices[0]] += 1
-                vert_edge_counts[edge.vertices[1]] += 1
-            
-            # 2. Lists for drawing batches
-            heatmap_pos = []
-            heatmap_col = []
-            
-            connector_pos = [] # For crest/base lines
-            
-            obj_base_color = getattr(obj, "sd_cgraph_color", (0, 1, 1, 1))
-
-            for edge in mesh.edges:
-                i1, i2 = edge.vertices[0], edge.vertices[1]
-                v1 = verts_co_world[i1]
-                v2 = verts_co_world[i2]
-                
-                # HEURISTIC:
-                # If both vertices of an edge have only 1 connection, 
-                # it's a disjoint "Comb Hair".
-                is_isolated_hair = (vert_edge_counts[i1] == 1 and vert_edge_counts[i2] == 1)
-                
-                if is_isolated_hair and use_gradient:
-                    # ---> RENDER AS HEATMAP (Vertical Bar)
-                    visual_length = (v1 - v2).length
-                    real_curvature_val = visual_length / modifier_graph_scale
-                    
-                    intensity = min(real_curvature_val / limit_setting, 1.0)
-                    color_rgba = get_heatmap_color(intensity)
-                    
-                    heatmap_pos.extend([v1, v2])
-                    heatmap_col.extend([color_rgba, color_rgba])
-                    
-                elif is_isolated_hair and not use_gradient:
-                    # ---> RENDER AS SOLID USER COLOR (Vertical Bar)
-                    heatmap_pos.extend([v1, v2])
-                    heatmap_col.extend([obj_base_color, obj_base_color])
-                    
-                else:
-                    # ---> RENDER AS CONNECTOR (Crest / Base)
-                    # We draw these separately with a clean contrast color
-                    # to visualize flow/acceleration.
-                    connector_pos.extend([v1, v2])
-
-            # --- BATCH DRAWING ---
-            
-            # 1. Draw Heatmap/Combs
-            if heatmap_pos:
-                shader_grad.bind()
-                batch = batch_for_shader(shader_grad, 'LINES', {"pos": heatmap_pos, "color": heatmap_col})
-                batch.draw(shader_grad)
-                
-            # 2. Draw Connectors (Crests)
-            if connector_pos:
-                shader_flat.bind()
-                # We draw connectors slightly thicker or different color to analyze flow
-                shader_flat.uniform_float("color", conn_color) 
-                
-                # Make connectors slightly distinct
-                prev_width = getattr(scene, "sd_cgraph_thickness", 2.0)
-                gpu.state.line_width_set(max(1.0, prev_width - 1.0)) # Slightly thinner for precision
-                
-                batch = batch_for_shader(shader_flat, 'LINES', {"pos": connector_pos})
-                batch.draw(shader_flat)
-                
-                # Restore width
-                gpu.state.line_width_set(prev_width)
-
-        eval_obj.to_mesh_clear()
+        # Make connectors slightly distinct. Drawn last, so the width
+        # is restored once below together with the rest of the state.
+        gpu.state.line_width_set(max(1.0, thickness - 1.0)) # Slightly thinner for precision
+
+        draw_in_object_space(conn_batches, shader_flat)
 
     # Restore GPU State
-    if getattr(scene, "sd_cgraph_always_on_top", True):
+    if always_on_top:
         gpu.state.depth_test_set('LESS_EQUAL')
     gpu.state.line_width_set(1.0)
 
@@ -254,10 +564,19 @@ class SNA_OT_ToggleRenderer(bpy.types.Operator):
                 except: pass
             draw_handler = None
             is_drawing_active = False
-            for obj in scene_objs: remove_curve_to_mesh(obj)
+            for name in _candidates:
+                obj = scene_objs.get(name)
+                if obj: remove_curve_to_mesh(obj)
+            _candidates.clear()
+            _pending_inject.clear()
+            invalidate_geometry()
+            _topology_cache.clear()
+            # Don't keep the last frame's GPU batches alive while disabled
+            _frame_batches.clear()
             self.report({'INFO'}, "SD CGraph: Disabled")
         else:
-            for obj in scene_objs: inject_curve_to_mesh(obj)
+            refresh_candidates(context.scene)
+            for name in _candidates: inject_curve_to_mesh(scene_objs[name])
             if draw_handler is None:
                 draw_handler = bpy.types.SpaceView3D.draw_handler_add(draw_lines_callback, (), 'WINDOW', 'POST_VIEW')
             is_drawing_active = True
@@ -273,7 +592,8 @@ class SNA_OT_RefreshNodes(bpy.types.Operator):
     bl_label = "Refresh Nodes"
     def execute(self, context):
         if is_drawing_active:
-            for obj in context.scene.objects: inject_curve_to_mesh(obj)
+            refresh_candidates(context.scene)
+            for name in _candidates: inject_curve_to_mesh(context.scene.objects[name])
             context.area.tag_redraw()
         return {'FINISHED'}
 
@@ -310,10 +630,7 @@ class SNA_PT_RendererPanel(bpy.types.Panel):
             # Color solo si no es Heatmap
             box = layout.box()
             if obj:
-                has_mod = False
-                for m in obj.modifiers:
-                    if m.type=='NODES' and m.node_group and "cgraph" in m.node_group.name.lower(): has_mod=True
-                if has_mod:
+                if scan_cgraph_modifier(obj):
                     box.prop(obj, "sd_cgraph_color", text="")
                     box.label(text=obj.name, icon='OBJECT_DATA')
                 else: box.label(text="Select Obj", icon='INFO')
@@ -334,6 +651,12 @@ class SNA_PT_RendererPanel(bpy.types.Panel):
 classes = (SNA_OT_ToggleRenderer, SNA_OT_RefreshNodes, SNA_PT_RendererPanel)
 
 def register():
+    global _heat_lut, _executor
+    _heat_lut = get_heatmap_colors(np.linspace(0.0, 1.0, HEAT_LUT_SIZE))
+    # A single core gains nothing from the handoff
+    workers = min(4, os.cpu_count() or 1)
+    if workers > 1: _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sd_cgraph")
+
     bpy.types.Object.sd_cgraph_color = bpy.props.FloatVectorProperty(
         name="Color", subtype='COLOR', default=(0,1,1,1), size=4, min=0, max=1
     )
@@ -351,8 +674,12 @@ def register():
 
     for c in classes: bpy.utils.register_class(c)
 
+    bpy.app.handlers.depsgraph_update_post.append(on_depsgraph_update)
+    bpy.app.handlers.frame_change_post.append(on_frame_change)
+    bpy.app.handlers.load_post.append(on_load_post)
+
 def unregister():
-    global draw_handler, is_drawing_active
+    global draw_handler, is_drawing_active, _executor
     if is_drawing_active:
         try:
             for o in bpy.data.objects: remove_curve_to_mesh(o)
@@ -362,6 +689,23 @@ def unregister():
         except: pass
     draw_handler = None
     is_drawing_active = False
+
+    for handlers, fn in ((bpy.app.handlers.depsgraph_update_post, on_depsgraph_update),
+                         (bpy.app.handlers.frame_change_post, on_frame_change),
+                         (bpy.app.handlers.load_post, on_load_post)):
+        if fn in handlers: handlers.remove(fn)
+    if bpy.app.timers.is_registered(inject_pending): bpy.app.timers.unregister(inject_pending)
+    _pending_inject.clear()
+    invalidate_geometry()
+    _topology_cache.clear()
+    _candidates.clear()
+    _known_objects.clear()
+    _output_cache.clear()
+    _ng_is_cgraph.clear()
+    _frame_batches.clear()
+    if _executor:
+        _executor.shutdown()
+        _executor = None
     
     for c in reversed(classes): bpy.utils.unregister_class(c)
     del bpy.types.Object.sd_cgraph_color